@@ -2,8 +2,7 @@ import datetime
 import selectors
 import socket
 from asyncio import base_events, events      # type: ignore
-import collections
-import heapq
+from heapq import heappush, heappop
 
 # A class to manage set of next events:
 from asyncio.selector_events import _SelectorSocketTransport    # type: ignore # noqa
@@ -15,49 +14,73 @@ import time
 from mpf.core.clock import ClockBase
 from serial_asyncio import SerialTransport
 
+_READ = selectors.EVENT_READ
+_WRITE = selectors.EVENT_WRITE
+
 
 class NextTimers:
 
-    """Next timers."""
+    """Next timers.
+
+    Only the float ``when`` of each timer is stored so heap ordering never
+    falls back to comparing TimerHandles.
+    """
 
-    __slots__ = ["_timers_set", "_timers_heap"]
+    __slots__ = ["_timers_heap"]
 
     def __init__(self):
-        # Timers set. Used to check uniqueness:
-        self._timers_set = set()
-        # Timers heap. Used to get the closest timer event:
+        # Timers heap. Used to get the closest timer event. Duplicates are
+        # allowed here and dropped lazily in try_pop. It is a list because
+        # heapq only accepts lists (not array.array):
         self._timers_heap = []
 
     def add(self, when):
         """
         Add a timer (Future event).
-        """
-        # We don't add a time twice:
-        if when in self._timers_set:
-            return
 
-        # Add to set:
-        self._timers_set.add(when)
-        # Add to heap:
-        heapq.heappush(self._timers_heap, when)
+        Infinite timers sort after (or before for -inf) all finite ones.
+        NaN cannot be ordered and raises a ValueError.
+        """
+        if when != when:
+            raise ValueError("Cannot add timer at {}".format(when))
+        # Tests mostly add timers in increasing order. heappush only compares
+        # those against their parent once so adding is O(1) in that case.
+        heappush(self._timers_heap, when)
 
     def is_empty(self):
-        return not self._timers_set
+        return not self._timers_heap
 
     def pop_closest(self):
         """
         Get closest event timer. (The one that will happen the soonest).
         """
-        try:
-            when = heapq.heappop(self._timers_heap)
-            self._timers_set.remove(when)
-        except IndexError:
+        when = self.try_pop()
+        if when is None:
             raise IndexError('NextTimers is empty')
 
         return when
 
+    def try_pop(self, default=None):
+        """
+        Get closest event timer or default if there is none.
+        """
+        timers_heap = self._timers_heap
+        if not timers_heap:
+            return default
+
+        when = heappop(timers_heap)
+        # We don't return a time twice:
+        while timers_heap and timers_heap[0] == when:
+            heappop(timers_heap)
+
+        return when
+
     def __repr__(self):
-        return str(self._timers_set)
+        return str(sorted(set(self._timers_heap)))
+
+
+def _noop():
+    """Ignore ready events."""
 
 
 class _TestTransport:
@@ -67,10 +90,7 @@ class _TestTransport:
     def __init__(self, loop, sock):
         self._loop = loop
         self._sock = sock
-        self._loop.add_reader(self._sock, self._read_ready)
-
-    def _read_ready(self):
-        pass
+        self._loop.add_reader(self._sock, _noop)
 
     def write(self, msg):
         pass
@@ -193,6 +213,8 @@ class MockServer:
 
 class MockSerial(MockFd):
 
+    # No __slots__ here. Tests combine MockSerial with MockSocket (e.g.
+    # MockLisySocket) which would cause an instance layout conflict.
 
     def __init__(self):
         super().__init__()
@@ -221,29 +243,35 @@ class MockSerial(MockFd):
 
 class TestSelector(selectors.BaseSelector):
 
-    __slots__ = ["keys"]
+    __slots__ = ["keys", "_ready_checks"]
 
     def __init__(self):
         self.keys = {}
+        # Bound ready checks for the registered events by fileobj:
+        self._ready_checks = {}
 
     def register(self, fileobj, events, data=None):
         key = selectors.SelectorKey(fileobj, 0, events, data)
         self.keys[fileobj] = key
+        self._ready_checks[fileobj] = (key,
+                                       fileobj.read_ready if events & _READ else None,
+                                       fileobj.write_ready if events & _WRITE else None)
         return key
 
     def unregister(self, fileobj):
+        del self._ready_checks[fileobj]
         return self.keys.pop(fileobj)
 
     def select(self, timeout=None):
         del timeout
-        if not self.keys:
+        if not self._ready_checks:
             return []
         ready = []
-        for sock, key in self.keys.items():
-            if sock.read_ready():
-                ready.append((key, selectors.EVENT_READ))
-            if sock.write_ready():
-                ready.append((key, selectors.EVENT_WRITE))
+        for key, read_ready, write_ready in self._ready_checks.values():
+            if read_ready and read_ready():
+                ready.append((key, _READ))
+            if write_ready and write_ready():
+                ready.append((key, _WRITE))
         return ready
 
     def get_map(self):
@@ -261,6 +289,9 @@ class TimeTravelLoop(base_events.BaseEventLoop):
     __slots__ = ["readers", "writers", "_time", "_clock_resolution", "_timers", "_selector", "_transports",
                  "_wait_for_external_executor", "_stopped"]
 
+    # Indices into (reader, writer) of the key data for every event mask:
+    _EVENT_DISPATCH = ((), (0,), (1,), (0, 1))
+
     def __init__(self):
         self.readers = {}
         self.writers = {}
@@ -273,7 +304,6 @@ class TimeTravelLoop(base_events.BaseEventLoop):
         self._timers = NextTimers()
         self._selector = TestSelector()
         self._transports = {}   # needed for newer asyncio on windows
-        self.reset_counters()
         self._wait_for_external_executor = False
 
     def close(self, ignore_running_tasks=False) -> None:
@@ -320,17 +350,19 @@ class TimeTravelLoop(base_events.BaseEventLoop):
 
     def add_reader(self, fd, callback, *args):
         """Add a reader callback."""
-        self._check_closed()
+        if self._closed:
+            raise RuntimeError('Event loop is closed')
         handle = events.Handle(callback, args, self)
+        selector = self._selector
         try:
-            key = self._selector.get_key(fd)
+            key = selector.get_key(fd)
         except KeyError:
-            self._selector.register(fd, selectors.EVENT_READ,
-                                    (handle, None))
+            selector.register(fd, _READ,
+                              (handle, None))
         else:
             mask, (reader, writer) = key.events, key.data
-            self._selector.modify(fd, mask | selectors.EVENT_READ,
-                                  (handle, writer))
+            selector.modify(fd, mask | _READ,
+                            (handle, writer))
             if reader is not None:
                 reader.cancel()
 
@@ -344,19 +376,20 @@ class TimeTravelLoop(base_events.BaseEventLoop):
 
     def remove_reader(self, fd):
         """Remove a reader callback."""
-        if self.is_closed():
+        if self._closed:
             return False
+        selector = self._selector
         try:
-            key = self._selector.get_key(fd)
+            key = selector.get_key(fd)
         except KeyError:
             return False
         else:
             mask, (reader, writer) = key.events, key.data
-            mask &= ~selectors.EVENT_READ
+            mask &= ~_READ
             if not mask:
-                self._selector.unregister(fd)
+                selector.unregister(fd)
             else:
-                self._selector.modify(fd, mask, (None, writer))
+                selector.modify(fd, mask, (None, writer))
 
             if reader is not None:
                 reader.cancel()
@@ -369,17 +402,19 @@ class TimeTravelLoop(base_events.BaseEventLoop):
 
     def add_writer(self, fd, callback, *args):
         """Add a writer callback.."""
-        self._check_closed()
+        if self._closed:
+            raise RuntimeError('Event loop is closed')
         handle = events.Handle(callback, args, self)
+        selector = self._selector
         try:
-            key = self._selector.get_key(fd)
+            key = selector.get_key(fd)
         except KeyError:
-            self._selector.register(fd, selectors.EVENT_WRITE,
-                                    (None, handle))
+            selector.register(fd, _WRITE,
+                              (None, handle))
         else:
             mask, (reader, writer) = key.events, key.data
-            self._selector.modify(fd, mask | selectors.EVENT_WRITE,
-                                  (reader, handle))
+            selector.modify(fd, mask | _WRITE,
+                            (reader, handle))
             if writer is not None:
                 writer.cancel()
 
@@ -388,20 +423,21 @@ class TimeTravelLoop(base_events.BaseEventLoop):
 
     def remove_writer(self, fd):
         """Remove a writer callback."""
-        if self.is_closed():
+        if self._closed:
             return False
+        selector = self._selector
         try:
-            key = self._selector.get_key(fd)
+            key = selector.get_key(fd)
         except KeyError:
             return False
         else:
             mask, (reader, writer) = key.events, key.data
             # Remove both writer and connector.
-            mask &= ~selectors.EVENT_WRITE
+            mask &= ~_WRITE
             if not mask:
-                self._selector.unregister(fd)
+                selector.unregister(fd)
             else:
-                self._selector.modify(fd, mask, (reader, None))
+                selector.modify(fd, mask, (reader, None))
 
             if writer is not None:
                 writer.cancel()
@@ -417,24 +453,19 @@ class TimeTravelLoop(base_events.BaseEventLoop):
         assert handle[1] == args, '{!r} != {!r}'.format(
             handle[1], args)
 
-    def reset_counters(self):
-        self.remove_reader_count = collections.defaultdict(int)
-        self.remove_writer_count = collections.defaultdict(int)
-
     def run_once(self):
-        if hasattr(events, "_set_running_loop"):
-            events._set_running_loop(self)
+        events._set_running_loop(self)
 
         self._run_once()
 
-        if hasattr(events, "_set_running_loop"):
-            events._set_running_loop(None)
+        events._set_running_loop(None)
 
     def _run_once(self):
         # Advance time only when we finished everything at the present:
-        if len(self._ready) == 0:
-            if not self._timers.is_empty():
-                self._time = self._timers.pop_closest()
+        if not self._ready:
+            when = self._timers.try_pop()
+            if when is not None:
+                self._time = when
             elif not self._closed and not self._stopped and not self._selector.select(0) and \
                     not self._wait_for_external_executor:
                 raise AssertionError("Ran into an infinite loop. No socket ready and nothing scheduled.")
@@ -450,21 +481,28 @@ class TimeTravelLoop(base_events.BaseEventLoop):
         return super().call_at(when, callback, *args, **kwargs)
 
     def _process_events(self, event_list):
+        ready = []
         for key, mask in event_list:
-            fileobj, (reader, writer) = key.fileobj, key.data
-            if mask & selectors.EVENT_READ and reader is not None:
-                if reader._cancelled:
-                    self.remove_reader(fileobj)
-                else:
-                    self._add_callback(reader)
-            if mask & selectors.EVENT_WRITE and writer is not None:
-                if writer._cancelled:
+            fileobj, handles = key.fileobj, key.data
+            # handles is (reader, writer)
+            for index in self._EVENT_DISPATCH[mask & 3]:
+                handle = handles[index]
+                if handle is None:
+                    continue
+                if not handle._cancelled:
+                    ready.append(handle)
+                elif index:
                     self.remove_writer(fileobj)
                 else:
-                    self._add_callback(writer)
+                    self.remove_reader(fileobj)
+        self._ready.extend(ready)
 
     def _write_to_self(self):
-        pass
+        """Do not wake up the loop.
+
+        This loop is based on BaseEventLoop and never creates a self-pipe.
+        Time only passes in _run_once so there is nothing to wake up.
+        """
 
 
 class TestClock(ClockBase):
@@ -0,0 +1,170 @@
+import random
+import selectors
+import unittest
+
+from mpf.tests.loop import NextTimers, TimeTravelLoop, MockQueueSocket, TestSelector
+
+
+class TestNextTimers(unittest.TestCase):
+
+    def _pop_all(self, timers):
+        result = []
+        while not timers.is_empty():
+            result.append(timers.pop_closest())
+        return result
+
+    def test_duplicates(self):
+        timers = NextTimers()
+        for when in (1.5, 0.2, 1.5, 0.2, 1.5, 3.0):
+            timers.add(when)
+
+        self.assertEqual(0.2, timers.pop_closest())
+        # add a time again after it has been popped
+        timers.add(0.2)
+        self.assertEqual([0.2, 1.5, 3.0], self._pop_all(timers))
+
+    def test_negative_times(self):
+        timers = NextTimers()
+        for when in (0.0005, -0.0005, 0.0, -0.0015, -2.0, 0.0009):
+            timers.add(when)
+
+        self.assertEqual([-2.0, -0.0015, -0.0005, 0.0, 0.0005, 0.0009], self._pop_all(timers))
+
+    def test_close_times(self):
+        timers = NextTimers()
+        for when in (0.002, 0.001, 0.0019999, 0.0010001, 0.000999, 1.0, 0.999999):
+            timers.add(when)
+
+        self.assertEqual([0.000999, 0.001, 0.0010001, 0.0019999, 0.002, 0.999999, 1.0], self._pop_all(timers))
+
+    def test_non_finite(self):
+        timers = NextTimers()
+        for when in (float("inf"), 1.0, float("-inf"), float("inf")):
+            timers.add(when)
+
+        self.assertEqual([float("-inf"), 1.0, float("inf")], self._pop_all(timers))
+
+        # huge finite timers still sort by value
+        for when in (1e306, float("inf"), 1.7e305, -1e306):
+            timers.add(when)
+
+        self.assertEqual([-1e306, 1.7e305, 1e306, float("inf")], self._pop_all(timers))
+
+        with self.assertRaises(ValueError):
+            timers.add(float("nan"))
+
+    def test_empty(self):
+        timers = NextTimers()
+        self.assertTrue(timers.is_empty())
+        self.assertIsNone(timers.try_pop())
+        self.assertEqual(7, timers.try_pop(7))
+        with self.assertRaises(IndexError):
+            timers.pop_closest()
+
+        timers.add(1.0)
+        self.assertFalse(timers.is_empty())
+        self.assertEqual(1.0, timers.try_pop(7))
+        self.assertTrue(timers.is_empty())
+        self.assertEqual(7, timers.try_pop(7))
+
+    def test_against_reference(self):
+        rand = random.Random(42)
+        for _ in range(200):
+            timers = NextTimers()
+            reference = set()
+            for _ in range(rand.randint(0, 100)):
+                if reference and rand.random() < 0.4:
+                    closest = min(reference)
+                    reference.remove(closest)
+                    self.assertEqual(closest, timers.pop_closest())
+                else:
+                    when = rand.choice([rand.uniform(-1, 5), round(rand.uniform(-1, 5), 3), 1.0, 0.0])
+                    timers.add(when)
+                    reference.add(when)
+
+            self.assertEqual(sorted(reference), self._pop_all(timers))
+
+
+class TestTestSelector(unittest.TestCase):
+
+    def test_register_modify_unregister(self):
+        selector = TestSelector()
+        sock = MockQueueSocket(None)
+        other_sock = MockQueueSocket(None)
+        self.assertEqual([], selector.select())
+
+        key = selector.register(sock, selectors.EVENT_READ, "data")
+        self.assertIs(key, selector.get_key(sock))
+        self.assertEqual({sock: key}, selector.get_map())
+        with self.assertRaises(KeyError):
+            selector.get_key(other_sock)
+
+        # only registered events are reported
+        self.assertEqual([], selector.select())
+        sock.recv_queue.append(b"test")
+        self.assertEqual([(key, selectors.EVENT_READ)], selector.select())
+
+        # modify is unregister + register
+        key = selector.modify(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, "new_data")
+        self.assertIs(key, selector.get_key(sock))
+        self.assertEqual("new_data", key.data)
+        self.assertEqual([(key, selectors.EVENT_READ), (key, selectors.EVENT_WRITE)], selector.select())
+
+        self.assertIs(key, selector.unregister(sock))
+        with self.assertRaises(KeyError):
+            selector.get_key(sock)
+        self.assertEqual({}, selector.get_map())
+        self.assertEqual([], selector.select())
+
+
+class TestTimeTravelLoop(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = TimeTravelLoop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def _callback(self):
+        pass
+
+    def _other_callback(self):
+        pass
+
+    def _assert_replaced(self, old_handle, new_handle, callback):
+        self.assertIsNot(old_handle, new_handle)
+        self.assertTrue(old_handle.cancelled())
+        self.assertFalse(new_handle.cancelled())
+        self.assertEqual(callback, new_handle._callback)
+
+    def _check_add_callback(self, add, remove, index):
+        """Check add_reader/add_writer. index is the position of the handle in (reader, writer)."""
+        sock = MockQueueSocket(self.loop)
+        add(sock, self._callback, 1)
+        first = self.loop._selector.get_key(sock).data[index]
+
+        # same callback and args still create a new handle
+        add(sock, self._callback, 1)
+        second = self.loop._selector.get_key(sock).data[index]
+        self._assert_replaced(first, second, self._callback)
+
+        # different callback
+        add(sock, self._other_callback)
+        third = self.loop._selector.get_key(sock).data[index]
+        self._assert_replaced(second, third, self._other_callback)
+
+        # cancelled old handle
+        third.cancel()
+        add(sock, self._other_callback)
+        fourth = self.loop._selector.get_key(sock).data[index]
+        self._assert_replaced(third, fourth, self._other_callback)
+
+        self.assertTrue(remove(sock))
+        self.assertTrue(fourth.cancelled())
+        self.assertFalse(remove(sock))
+
+    def test_add_reader(self):
+        self._check_add_callback(self.loop.add_reader, self.loop.remove_reader, 0)
+
+    def test_add_writer(self):
+        self._check_add_callback(self.loop.add_writer, self.loop.remove_writer, 1)